@@ -1,7 +1,10 @@
 import streamlit as st
 import qrcode, base64, time
+from urllib.parse import quote
+import pandas as pd
 from io import BytesIO
 from datetime import datetime, timezone, timedelta
+import hmac
 from supabase import create_client, Client
 
 # IST timezone
@@ -11,32 +14,48 @@ def ist_time_str(): return ist_now().strftime("%H:%M:%S")
 def ist_date_str(): return ist_now().strftime("%d-%m-%Y")
 def ist_datetime_str(): return ist_now().strftime("%d-%m-%Y %H:%M:%S")
 
-# Supabase client
-try:
-    supabase: Client = create_client(
+# Supabase client (built once per process and shared by every session/rerun)
+@st.cache_resource
+def get_supabase() -> Client:
+    return create_client(
         st.secrets["supabase"]["url"],
         st.secrets["supabase"]["key"]
     )
+
+try:
+    supabase: Client = get_supabase()
 except Exception as e:
     st.error(f"Supabase connection error: {e}")
     st.stop()
 
-# Admin credentials
+# Admin credentials (read from secrets once per process)
+@st.cache_resource
+def load_admins():
+    return {st.secrets["admin_user"]["username"]: {"password": st.secrets["admin_user"]["password"]}}
+
 try:
-    ADMINS = {st.secrets["admin_user"]["username"]: {"password": st.secrets["admin_user"]["password"]}}
+    ADMINS = load_admins()
 except KeyError as e:
     st.error(f"Missing secret: {e}"); st.stop()
 
-# Session state defaults
-for k, v in {
+def is_admin(username, password):
+    """Credential check; the password comparison is constant-time"""
+    admin = ADMINS.get(username)
+    return admin is not None and hmac.compare_digest(str(admin["password"]).encode(), password.encode())
+
+# Session state defaults (seeded once per session, not re-checked on every rerun)
+SESSION_DEFAULTS = {
     "admin_logged": False, "admin_user": None,
     "qr_active": False, "qr_start_time": None,
     "qr_window_seconds": 60, "qr_location_enabled": False,
     "qr_token": None, "qr_image": None,
     "qr_last_refresh": None, "qr_company": None,
     "qr_refresh_seconds": 30,
-}.items():
-    if k not in st.session_state: st.session_state[k] = v
+}
+if "_session_inited" not in st.session_state:
+    for k, v in SESSION_DEFAULTS.items():
+        st.session_state.setdefault(k, v)
+    st.session_state["_session_inited"] = True
 
 # ── Supabase Functions ────────────────────────────────────
 def log_action(action, details="", username=None):
@@ -49,11 +68,15 @@ def log_action(action, details="", username=None):
         }).execute()
     except: pass
 
+@st.cache_data(ttl=30, show_spinner=False)
+def _fetch_companies():
+    response = supabase.table('companies').select('name').order('name').execute()
+    return [row['name'] for row in response.data]
+
 def load_companies():
-    """Get list of companies"""
+    """Get list of companies (cached for 30s; cleared by add_company)"""
     try:
-        response = supabase.table('companies').select('name').order('name').execute()
-        return [row['name'] for row in response.data]
+        return _fetch_companies()
     except:
         return []
 
@@ -61,12 +84,12 @@ def add_company(name):
     """Add company if doesn't exist"""
     try:
         supabase.table('companies').insert({'name': name}).execute()
+        _fetch_companies.clear()
     except:
         pass  # Already exists
 
 def make_qr(token, company, loc_enabled, refresh_secs=30):
-    import urllib.parse
-    company_enc = urllib.parse.quote(company)
+    company_enc = quote(company)
     url = f"https://smartapp12.streamlit.app?access={token}&company={company_enc}&loc={1 if loc_enabled else 0}&window={refresh_secs}"
     qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
     qr.add_data(url); qr.make(fit=True)
@@ -80,7 +103,7 @@ def admin_login():
     u = st.text_input("Username", key="login_u")
     p = st.text_input("Password", type="password", key="login_p")
     if st.button("Login", type="primary"):
-        if u in ADMINS and ADMINS[u]["password"] == p:
+        if is_admin(u, p):
             st.session_state.admin_logged = True
             st.session_state.admin_user = u
             log_action("admin_login", u); st.rerun()
@@ -188,7 +211,8 @@ def admin_panel():
         c1, c2 = st.columns(2)
         with c1:
             if st.button("🔲 Start QR Session", type="primary", key="start_qr", disabled=not can_go):
-                add_company(sel_company)
+                if sel_company not in companies:
+                    add_company(sel_company)
                 ts = int(time.time())
                 token = f"qr_{ts}"
                 st.session_state.update({
@@ -258,7 +282,6 @@ def admin_panel():
         try:
             response = supabase.table('admin_logs').select('*').order('timestamp', desc=True).limit(50).execute()
             if response.data:
-                import pandas as pd
                 df = pd.DataFrame(response.data)
                 st.dataframe(df[['timestamp', 'action', 'details', 'username']], use_container_width=True)
             else:
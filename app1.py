@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timezone, timedelta
-import time, urllib.parse
-from math import radians, sin, cos, sqrt, atan2
+from datetime import datetime, date, timezone, timedelta
+import hmac, time, uuid
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from math import radians, cos, pi, hypot
 from supabase import create_client, Client
 
 # streamlit-js-eval for GPS
@@ -18,29 +21,78 @@ def ist_now(): return datetime.now(IST)
 def ist_time_str(): return ist_now().strftime("%H:%M:%S")
 def ist_date_str(): return ist_now().strftime("%d-%m-%Y")
 def ist_datetime_str(): return ist_now().strftime("%d-%m-%Y %H:%M:%S")
-
-# Supabase client
-try:
-    supabase: Client = create_client(
+def ist_now_strs():
+    """(time, date) strings from a single clock read, so both stamps agree across midnight"""
+    n = ist_now()
+    return f"{n.hour:02d}:{n.minute:02d}:{n.second:02d}", f"{n.day:02d}-{n.month:02d}-{n.year}"
+
+# Supabase client (built once per process and shared by every session/rerun)
+@st.cache_resource
+def get_supabase() -> Client:
+    return create_client(
         st.secrets["supabase"]["url"],
         st.secrets["supabase"]["key"]
     )
+
+try:
+    supabase: Client = get_supabase()
 except Exception as e:
     st.error(f"Supabase connection error: {e}")
     st.stop()
 
-# Admin credentials
+# Admin credentials (read from secrets once per process)
+@st.cache_resource
+def load_admins():
+    return {st.secrets["admin_user"]["username"]: {"password": st.secrets["admin_user"]["password"]}}
+
 try:
-    ADMINS = {st.secrets["admin_user"]["username"]: {"password": st.secrets["admin_user"]["password"]}}
+    ADMINS = load_admins()
 except KeyError as e:
     st.error(f"Missing secret: {e}"); st.stop()
 
+def is_admin(username, password):
+    """Credential check; the password comparison is constant-time"""
+    admin = ADMINS.get(username)
+    return admin is not None and hmac.compare_digest(str(admin["password"]).encode(), password.encode())
+
 COLLEGE_LAT = 17.4558417
 COLLEGE_LON = 78.6670873
 RADIUS_M    = 500
-
-# Session state defaults
-for k, v in {
+EARTH_R_M   = 6371000
+
+# Metres per degree around the college (equirectangular; sub-centimetre error within RADIUS_M)
+M_PER_DEG_LAT = EARTH_R_M * pi / 180
+M_PER_DEG_LON = M_PER_DEG_LAT * cos(radians(COLLEGE_LAT))
+
+# How long a confirmed device binding is trusted without re-reading device_binding, so an
+# unbind made by another app instance or in the database takes effect within this window
+BINDING_CACHE_SECS = 60
+# Likewise for "already marked" answers, so a mark deleted in the database stops blocking the student
+MARKED_CACHE_SECS = 60
+
+# Browser geolocation probe for streamlit_js_eval. A fixed string, so the component payload
+# (and with it the component identity for a given key) is identical on every rerun.
+GPS_JS = """
+new Promise((resolve) => {
+    if (!navigator.geolocation) {
+        resolve({error: {code: 99}});
+        return;
+    }
+    navigator.geolocation.getCurrentPosition(
+        (pos) => resolve({coords: {latitude: pos.coords.latitude, longitude: pos.coords.longitude}}),
+        (err) => resolve({error: {code: err.code}}),
+        {enableHighAccuracy: false, timeout: 6000, maximumAge: 60000}
+    );
+})
+"""
+
+# Student columns stored in the database (upload schema + admin report columns)
+STUDENT_DB_COLS = ['rollnumber', 'name', 'course', 'mobile', 'email', 'gender',
+                   'current_term_score', 'xth_percentage', 'xiith_percentage', 'backlogs']
+STUDENT_DB_SELECT = ', '.join(STUDENT_DB_COLS)
+
+# Session state defaults (seeded once per session, not re-checked on every rerun)
+SESSION_DEFAULTS = {
     "admin_logged_app1": False,
     "qr_access_granted": False,
     "location_verified": False,
@@ -49,46 +101,123 @@ for k, v in {
     "device_id": None,
     "gps_lat": None,
     "gps_lon": None,
-}.items():
-    if k not in st.session_state: st.session_state[k] = v
+}
+if "_session_inited" not in st.session_state:
+    for k, v in SESSION_DEFAULTS.items():
+        st.session_state.setdefault(k, v)
+    st.session_state["_session_inited"] = True
 
 # ── Supabase Functions ────────────────────────────────────
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    lat1,lon1,lat2,lon2 = map(radians,[lat1,lon1,lat2,lon2])
-    dlat,dlon = lat2-lat1,lon2-lon1
-    a = sin(dlat/2)**2 + cos(lat1)*cos(lat2)*sin(dlon/2)**2
-    return R * 2 * atan2(sqrt(a), sqrt(1-a))
+def _find_roll_col(cols):
+    """Roll-number column in an uploaded sheet's header: 'Roll No' or 'rollnumber'"""
+    return next((c for c in ('Roll No', 'rollnumber') if c in cols), None)
 
 def in_range(user_lat, user_lon):
-    d = haversine(COLLEGE_LAT, COLLEGE_LON, user_lat, user_lon)
+    dlat_m = (user_lat - COLLEGE_LAT) * M_PER_DEG_LAT
+    dlon_m = (user_lon - COLLEGE_LON) * M_PER_DEG_LON
+    d = hypot(dlat_m, dlon_m)
     return d <= RADIUS_M, d
 
+@st.cache_data(ttl=30, show_spinner=False)
+def load_companies():
+    """Get list of companies (cached for 30s; cleared when a new company is added)"""
+    response = supabase.table('companies').select('name').order('name').execute()
+    return [row['name'] for row in response.data]
+
+def add_company(name):
+    """Add company if doesn't exist"""
+    try:
+        supabase.table('companies').insert({'name': name}).execute()
+        load_companies.clear()
+    except:
+        pass  # Already exists
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_student_rolls(page_size=1000):
+    """All roll numbers in the students table as a frozenset (cached; cleared after upload)"""
+    rolls, start = [], 0
+    while True:
+        page = supabase.table('students').select('rollnumber').order('rollnumber') \
+            .range(start, start + page_size - 1).execute()
+        rolls.extend(row['rollnumber'] for row in page.data)
+        if len(page.data) < page_size:
+            return frozenset(rolls)
+        start += page_size
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_student_index(page_size=1000):
+    """Student rows keyed by roll number, for joining onto attendance (cached; cleared after upload)"""
+    index, start = {}, 0
+    while True:
+        page = supabase.table('students').select(STUDENT_DB_SELECT).order('rollnumber') \
+            .range(start, start + page_size - 1).execute()
+        index.update((row['rollnumber'], row) for row in page.data)
+        if len(page.data) < page_size:
+            return index
+        start += page_size
+
+@st.cache_resource
+def _known_bindings():
+    """Confirmed roll -> (device_id, monotonic time confirmed) seen by this server; trusted for BINDING_CACHE_SECS"""
+    return {}
+
+def _pgrst_quote(value):
+    """Double-quoted PostgREST filter value; commas/parens are literal inside, '\\' and '"' are escaped"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _binding_verdict(roll_lower, device_id):
+    """Apply one-device-one-student rules to existing bindings; None means no binding yet"""
+    # Fetch bindings for this device OR this roll in a single round-trip; both values are
+    # user-influenced (the roll is typed), so quote them rather than splicing raw filter syntax
+    existing = supabase.table('device_binding').select('rollnumber, device_id') \
+        .or_(f'device_id.eq.{_pgrst_quote(device_id)},rollnumber.eq.{_pgrst_quote(roll_lower)}').execute()
+
+    # Check if device already used
+    dev_rows = [b for b in existing.data if b['device_id'] == device_id]
+    if dev_rows:
+        bound_roll = dev_rows[0]['rollnumber']
+        if bound_roll != roll_lower:
+            return False, f"❌ This device is already used by **{bound_roll.upper()}**. One device = one student only."
+        return True, "ok"
+
+    # Check if roll already on different device
+    if existing.data:
+        return False, "❌ Your roll number is already registered on a different device. Contact admin to unbind."
+    return None
+
 def check_device_binding(rollnumber, device_id):
     """Check/create device binding"""
     if not device_id:
         return False, "❌ Device ID missing. Please refresh."
     roll_lower = rollnumber.strip().lower()
+    known = _known_bindings()
+    # Same student on the same device, recently confirmed -> no round-trip needed
+    hit = known.get(roll_lower)
+    if hit and hit[0] == device_id and time.monotonic() - hit[1] < BINDING_CACHE_SECS:
+        return True, "ok"
     try:
-        # Check if device already used
-        dev_check = supabase.table('device_binding').select('rollnumber').eq('device_id', device_id).execute()
-        if dev_check.data:
-            bound_roll = dev_check.data[0]['rollnumber']
-            if bound_roll != roll_lower:
-                return False, f"❌ This device is already used by **{bound_roll.upper()}**. One device = one student only."
-            return True, "ok"
-        
-        # Check if roll already on different device
-        roll_check = supabase.table('device_binding').select('device_id').eq('rollnumber', roll_lower).execute()
-        if roll_check.data:
-            return False, "❌ Your roll number is already registered on a different device. Contact admin to unbind."
+        verdict = _binding_verdict(roll_lower, device_id)
+        if verdict:
+            if verdict[0]:
+                known[roll_lower] = (device_id, time.monotonic())
+            return verdict
         
         # Create new binding
-        supabase.table('device_binding').insert({
-            'rollnumber': roll_lower,
-            'device_id': device_id,
-            'bound_at': ist_datetime_str()
-        }).execute()
+        try:
+            supabase.table('device_binding').insert({
+                'rollnumber': roll_lower,
+                'device_id': device_id,
+                'bound_at': ist_datetime_str()
+            }).execute()
+        except Exception:
+            # A concurrent mark may have bound this device/roll first (unique index) - re-check
+            verdict = _binding_verdict(roll_lower, device_id)
+            if verdict:
+                if verdict[0]:
+                    known[roll_lower] = (device_id, time.monotonic())
+                return verdict
+            raise
+        known[roll_lower] = (device_id, time.monotonic())
         return True, "ok"
     except Exception as e:
         return False, f"❌ Device binding error: {str(e)}"
@@ -98,51 +227,180 @@ def check_qr_access():
     if "access" in params:
         token = params["access"]
         if token.startswith("qr_"):
-            try:
-                ts = int(token.replace("qr_",""))
-                elapsed = int(time.time()) - ts
-                company = urllib.parse.unquote(params.get("company","General"))
-                loc_enabled = params.get("loc","0") == "1"
-                window_secs = int(params.get("window", "30"))
-                if elapsed <= window_secs:
-                    st.session_state.qr_access_granted = True
-                    st.session_state.current_company = company
-                    st.session_state.loc_required = loc_enabled
-                    return True, None
-                return False, f"⏰ QR expired ({elapsed}s old). Ask admin for the latest QR."
-            except: return False, "Invalid QR format."
+            # Token is qr_<unix seconds>; validate the digits up front instead of catching int() failures
+            ts_str, window_str = token[3:], params.get("window", "30")
+            if not (ts_str.isascii() and ts_str.isdigit() and window_str.isascii() and window_str.isdigit()):
+                return False, "Invalid QR format."
+            elapsed = int(time.time()) - int(ts_str)
+            company = unquote(params.get("company","General"))
+            loc_enabled = params.get("loc","0") == "1"
+            if elapsed <= int(window_str):
+                st.session_state.qr_access_granted = True
+                st.session_state.current_company = company
+                st.session_state.loc_required = loc_enabled
+                return True, None
+            return False, f"⏰ QR expired ({elapsed}s old). Ask admin for the latest QR."
     if st.session_state.qr_access_granted: return True, None
     return False, "Please scan the QR code shown by your admin."
 
+@st.cache_resource
+def _marked_pairs():
+    """(roll, company) -> monotonic time it was seen marked; trusted for MARKED_CACHE_SECS"""
+    return {}
+
+def _remember_marked(marked, key):
+    """Record key as seen marked now, pruning expired entries once the dict grows large"""
+    now = time.monotonic()
+    marked[key] = now
+    # Expired entries are only ever re-checked against the database; drop them in bulk
+    if len(marked) > 1024:
+        for k, seen in list(marked.items()):
+            if now - seen >= MARKED_CACHE_SECS:
+                marked.pop(k, None)
+
 def mark_attendance(rollnumber, company, device_id):
-    """Mark attendance with all security checks"""
+    """Mark attendance with all security checks; returns (ok, message, (time_str, date_str) stamped or None)"""
     try:
-        # Check if student exists
-        student_check = supabase.table('students').select('rollnumber').eq('rollnumber', rollnumber.strip().lower()).execute()
-        if not student_check.data:
-            return False, f"❌ Roll number '{rollnumber}' not found."
+        # Check if student exists (cached roster; confirm misses in case the cache predates an upload)
+        roll_lower = rollnumber.strip().lower()
+        if roll_lower not in load_student_rolls():
+            student_check = supabase.table('students').select('rollnumber').eq('rollnumber', roll_lower).execute()
+            if not student_check.data:
+                return False, f"❌ Roll number '{rollnumber}' not found.", None
+            load_student_rolls.clear()
+        
+        # Known repeat? Answer from memory before paying for any round-trip
+        marked = _marked_pairs()
+        seen = marked.get((roll_lower, company))
+        if seen is not None and time.monotonic() - seen < MARKED_CACHE_SECS:
+            return False, f"⚠️ Attendance already marked for {company}.", None
         
         # Device binding check
         ok, msg = check_device_binding(rollnumber, device_id)
-        if not ok: return False, msg
+        if not ok: return False, msg, None
         
         # Check if already marked for this company
-        dup_check = supabase.table('attendance').select('id').eq('rollnumber', rollnumber.strip().lower()).eq('company', company).execute()
+        dup_check = supabase.table('attendance').select('id').eq('rollnumber', roll_lower).eq('company', company).execute()
         if dup_check.data:
-            return False, f"⚠️ Attendance already marked for {company}."
+            _remember_marked(marked, (roll_lower, company))
+            return False, f"⚠️ Attendance already marked for {company}.", None
         
         # Insert attendance
+        time_str, date_str = ist_now_strs()
         supabase.table('attendance').insert({
-            'rollnumber': rollnumber.strip().lower(),
+            'rollnumber': roll_lower,
             'company': company,
-            'timestamp': ist_time_str(),
-            'datestamp': ist_date_str(),
+            'timestamp': time_str,
+            'datestamp': date_str,
             'device_id': device_id
         }).execute()
+        # Admin reports pick this up within their 30s TTL; clearing them on every student
+        # mark would empty the caches during the busy marking window they exist for
+        _remember_marked(marked, (roll_lower, company))
         
-        return True, "✅ Attendance marked successfully!"
+        return True, "✅ Attendance marked successfully!", (time_str, date_str)
     except Exception as e:
-        return False, f"❌ Error: {str(e)}"
+        return False, f"❌ Error: {str(e)}", None
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_attendance_with_students(company, datestamp=None):
+    """Attendance for a company (optionally a single day) joined with student details"""
+    query = supabase.table('attendance').select('*').eq('company', company)
+    if datestamp:
+        query = query.eq('datestamp', datestamp)
+    att = query.execute()
+    if not att.data:
+        return pd.DataFrame()
+    # Rows are already dicts: left-join against the cached student index (no pandas merge)
+    by_roll = load_student_index()
+    att_df = pd.DataFrame([{**row, **by_roll.get(row['rollnumber'], {})} for row in att.data])
+    att_df.insert(0, 'S.No', range(1, len(att_df) + 1))
+    return att_df
+
+def _attendance_count(company):
+    """Number of attendance rows for a company (server-side count, no rows transferred)"""
+    return supabase.table('attendance').select('id', count='exact', head=True).eq('company', company).execute().count or 0
+
+@st.cache_data(ttl=30, show_spinner=False)
+def attendance_counts(companies):
+    """{company: row count}; the count requests are independent round-trips, so run them concurrently"""
+    if not companies:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(8, len(companies))) as ex:
+        return dict(zip(companies, ex.map(_attendance_count, companies)))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def attendance_csv_bytes(company, datestamp=None):
+    """CSV download bytes for load_attendance_with_students (encoded once per cache window)"""
+    # Write straight into a bytes buffer rather than building the whole CSV as a str first
+    buf = BytesIO()
+    load_attendance_with_students(company, datestamp).to_csv(buf, index=False, encoding='utf-8')
+    return buf.getvalue()
+
+def clear_attendance_caches():
+    """Drop cached admin reports after an admin change (upload, manual entry) so it shows at once"""
+    load_attendance_with_students.clear()
+    attendance_csv_bytes.clear()
+    attendance_counts.clear()
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def parse_student_upload(name, data):
+    """Uploaded sheet -> frame of students table columns, or None without a roll column (cached on the file bytes)"""
+    if name.endswith('.csv'):
+        # Reject on the header row before parsing the whole file
+        if _find_roll_col(pd.read_csv(BytesIO(data), nrows=0).columns) is None:
+            return None
+        df = pd.read_csv(BytesIO(data))
+    else:
+        # openpyxl loads the whole workbook even for nrows=0, so read once and check the header after
+        df = pd.read_excel(BytesIO(data))
+    roll_col = _find_roll_col(df.columns)
+    if roll_col is None:
+        return None
+    if roll_col != 'rollnumber':
+        df = df.rename(columns={roll_col: 'rollnumber'})
+
+    # Normalize once; the key is already lowercase for every check downstream
+    df['rollnumber'] = df['rollnumber'].astype(str).str.strip().str.lower()
+
+    # Remove rows with empty/invalid roll numbers (single pass)
+    df = df[~df['rollnumber'].isin(['', 'nan', 'none', 'null', 'na'])]
+
+    # Map columns to database schema
+    col_map = {
+        'S.No.': 'sno',
+        'Name': 'name',
+        'Course': 'course',
+        'Mobile': 'mobile',
+        'Email ID': 'email',
+        'Gender': 'gender',
+        'Current Term Score': 'current_term_score',
+        'Xth percentage': 'xth_percentage',
+        'XIIth percentage': 'xiith_percentage',
+        'Backlogs': 'backlogs'
+    }
+    df = df.rename(columns=col_map)
+
+    # Select only columns that exist in DB
+    upload_cols = [c for c in STUDENT_DB_COLS if c in df.columns]
+    return df[upload_cols]
+
+# The browser does the waiting: the component reruns this fragment when the promise
+# settles, and the app reruns once a result is in
+@st.fragment
+def _gps_probe(retry_key):
+    gps_result = streamlit_js_eval(
+        js_expressions=GPS_JS,
+        want_output=True,
+        key=retry_key
+    )
+
+    if gps_result is None:
+        st.info("⏳ Getting your location...")
+        return
+
+    st.session_state["gps_result"] = gps_result
+    st.rerun()
 
 def check_location_with_js_eval(company):
     """GPS with button control to prevent 1000 simultaneous calls"""
@@ -150,38 +408,17 @@ def check_location_with_js_eval(company):
     st.warning("📍 **Location verification required.**")
     st.info("📍 Tap the button below, then Allow location when your browser asks.")
 
+    # The click itself is the rerun: carry on in this pass instead of scheduling another
     if st.button("📍 Verify My Location", type="primary", key="start_gps_btn"):
         st.session_state["gps_requested"] = True
-        st.rerun()
 
     if not st.session_state.get("gps_requested", False):
         st.stop()
 
-    retry_key = f"gps_{st.session_state.get('gps_retry', 0)}"
-    
-    with st.spinner("Getting your location..."):
-        gps_result = streamlit_js_eval(
-            js_expressions="""
-            new Promise((resolve) => {
-                if (!navigator.geolocation) {
-                    resolve({error: {code: 99}});
-                    return;
-                }
-                navigator.geolocation.getCurrentPosition(
-                    (pos) => resolve({coords: {latitude: pos.coords.latitude, longitude: pos.coords.longitude}}),
-                    (err) => resolve({error: {code: err.code}}),
-                    {enableHighAccuracy: false, timeout: 6000, maximumAge: 60000}
-                );
-            })
-            """,
-            want_output=True,
-            key=retry_key
-        )
-
+    gps_result = st.session_state.pop("gps_result", None)
     if gps_result is None:
-        time.sleep(0.3)
-        st.rerun()
-        return
+        _gps_probe(f"gps_{st.session_state.get('gps_retry', 0)}")
+        st.stop()
 
     st.session_state["gps_requested"] = False
 
@@ -205,7 +442,7 @@ def check_location_with_js_eval(company):
             st.session_state.location_verified = True
             st.session_state.gps_lat = lat
             st.session_state.gps_lon = lon
-            st.rerun()
+            return
         else:
             st.error("🚫 Blocked — Location out of college.")
             st.stop()
@@ -213,20 +450,205 @@ def check_location_with_js_eval(company):
         st.error("❌ Could not read location. Please try again.")
         st.stop()
 
+# ── Admin tabs ───────────────────────────────────────────
+# Each tab is a fragment: its widgets rerun only that tab, not the portal or the other tabs
+@st.fragment
+def _admin_upload_tab():
+    """Bulk student upload (CSV/Excel -> students table)"""
+    st.markdown("### 📂 Upload Students")
+    st.info("Upload Excel/CSV with student data. Will bulk insert to database.")
+    uf = st.file_uploader("Upload File", type=["csv", "xlsx"], key="stu_upload")
+    if uf:
+        try:
+            df_upload = parse_student_upload(uf.name, uf.getvalue())
+            if df_upload is None:
+                st.error("❌ Must have 'Roll No' or 'rollnumber' column!")
+                st.stop()
+            
+            st.success(f"✅ Found {len(df_upload)} students")
+            st.dataframe(df_upload.head(10), use_container_width=True)
+            
+            if st.button("📤 Upload to Database", key="do_upload"):
+                with st.spinner(f"Uploading {len(df_upload)} students..."):
+                    # Aggressively replace ALL NaN/inf values with None
+                    df_clean = df_upload.fillna('')  # First fill NaN with empty string
+                    df_clean = df_clean.replace(['nan', 'NaN', 'NAN', float('inf'), float('-inf')], None)
+                    
+                    data = df_clean.to_dict('records')
+                    
+                    # Clean each record
+                    for student in data:
+                        for key, value in list(student.items()):
+                            # Convert empty strings to None
+                            if value == '' or value == 'nan':
+                                student[key] = None
+                            # Handle mobile numbers specially
+                            elif key == 'mobile' and value is not None:
+                                try:
+                                    if isinstance(value, (int, float)):
+                                        student[key] = str(int(value))
+                                    else:
+                                        student[key] = str(value).strip()
+                                except (ValueError, TypeError):
+                                    student[key] = None
+                            # Handle numeric fields
+                            elif key in ['current_term_score', 'xth_percentage', 'xiith_percentage']:
+                                if value == '' or value is None:
+                                    student[key] = None
+                                else:
+                                    try:
+                                        student[key] = float(value)
+                                    except (ValueError, TypeError):
+                                        student[key] = None
+                    
+                    try:
+                        # Batch insert (500 at a time)
+                        batch_size = 500
+                        success_count = 0
+                        for i in range(0, len(data), batch_size):
+                            batch = data[i:i+batch_size]
+                            supabase.table('students').upsert(batch, on_conflict='rollnumber').execute()
+                            success_count += len(batch)
+                            st.info(f"Uploaded {success_count}/{len(data)} students...")
+                        load_student_rolls.clear()
+                        load_student_index.clear()
+                        clear_attendance_caches()
+                        st.success(f"✅ {len(data)} students uploaded successfully!")
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
+        except Exception as e:
+            st.error(f"❌ Error reading file: {str(e)}")
+
+@st.fragment
+def _admin_today_tab(comps):
+    """Today's attendance for one company, with CSV download"""
+    st.markdown("### 📅 Today's Attendance")
+    try:
+        if comps:
+            comp = st.selectbox("Company:", comps, key="today_comp")
+            today = ist_date_str()
+            
+            # Get attendance with student details
+            merged = load_attendance_with_students(comp, today)
+            if not merged.empty:
+                st.success(f"**{len(merged)} present**")
+                st.dataframe(merged, use_container_width=True, hide_index=True)
+                st.download_button("⬇️ Download", attendance_csv_bytes(comp, today), f"attendance_{comp}_{today}.csv", "text/csv")
+            else:
+                st.info("No attendance today.")
+    except Exception as e:
+        st.error(f"Error: {e}")
+
+@st.fragment
+def _admin_records_tab(comps):
+    """Per-company record counts plus a CSV download for one company"""
+    st.markdown("### 📋 All Attendance Records")
+    try:
+        if comps:
+            # Counts only here; the full join is built for the company picked for download
+            counts = attendance_counts(tuple(comps))
+            for comp, n in counts.items():
+                if n:
+                    c1,c2 = st.columns([2,2])
+                    with c1: st.write(f"🏢 **{comp}**")
+                    with c2: st.write(f"{n} records")
+                    st.markdown("---")
+            with_records = [comp for comp, n in counts.items() if n]
+            if with_records:
+                dl_comp = st.selectbox("Download records for:", with_records, key="dl_all_comp")
+                st.download_button("⬇️ Download CSV", attendance_csv_bytes(dl_comp), f"attendance_{dl_comp}.csv", "text/csv", key="dl_all_btn")
+    except Exception as e:
+        st.error(f"Error: {e}")
+
+@st.fragment
+def _admin_manual_tab(comps):
+    """Admin-side manual attendance entry"""
+    st.markdown("### ✍️ Manual Entry")
+    try:
+        rolls = load_student_rolls()
+        if rolls:
+            # Only ship the first matches to the browser, not the whole roster
+            q = st.text_input("Search Roll:", key="man_q", placeholder="type part of a roll number").strip().lower()
+            matches = sorted(r for r in rolls if q in r)
+            if len(matches) > 50:
+                st.caption(f"Showing 50 of {len(matches)} matches — type more to narrow down.")
+            man_roll = st.selectbox("Roll Number:", [""] + matches[:50], key="man_roll")
+        else:
+            man_roll = st.text_input("Roll:", key="man_roll_txt")
+        
+        mode = st.radio("Company:", ["Select Existing","Enter New"], horizontal=True, key="man_mode")
+        man_company = None
+        if mode == "Select Existing":
+            if comps: man_company = st.selectbox("Select:", comps, key="man_comp_sel")
+        if mode == "Enter New":
+            nc = st.text_input("Company Name:", key="man_new_comp")
+            if nc.strip(): man_company = nc.strip()
+        
+        man_date = st.date_input("Date:", value=date.today(), key="man_date")
+        
+        if st.button("✅ Mark", type="primary", key="man_mark"):
+            if man_roll and man_company:
+                ds = man_date.strftime("%d-%m-%Y")
+                try:
+                    supabase.table('attendance').insert({
+                        'rollnumber': str(man_roll).strip().lower(),
+                        'company': man_company,
+                        'timestamp': ist_time_str(),
+                        'datestamp': ds,
+                        'device_id': 'MANUAL_ADMIN'
+                    }).execute()
+                    clear_attendance_caches()
+                    if man_company not in comps:
+                        add_company(man_company)
+                    st.success(f"✅ {man_roll} marked for {man_company} on {ds}!")
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+            else:
+                st.warning("Enter both roll and company.")
+    except Exception as e:
+        st.error(f"Error: {e}")
+
+@st.fragment
+def _admin_bindings_tab():
+    """Device bindings list and unbind action"""
+    st.markdown("### 📱 Device Bindings")
+    st.info("One device = one student. Unbind here if student changes device.")
+    try:
+        bindings = supabase.table('device_binding').select('*').execute()
+        if bindings.data:
+            df = pd.DataFrame(bindings.data)
+            st.dataframe(df, use_container_width=True)
+            st.info(f"**{len(df)} devices bound**")
+            
+            to_unbind = st.selectbox("Roll to Unbind:", [""]+df['rollnumber'].tolist(), key="unbind_sel")
+            if to_unbind and st.button("🔓 Unbind", key="unbind_btn"):
+                supabase.table('device_binding').delete().eq('rollnumber', to_unbind).execute()
+                _known_bindings().pop(to_unbind, None)
+                st.success(f"✅ '{to_unbind}' unbound.")
+                st.rerun()
+        else:
+            st.info("No devices bound yet.")
+    except Exception as e:
+        st.error(f"Error: {e}")
+
 # ── Student portal ────────────────────────────────────────
 def student_portal(company, device_id):
     st.markdown('<h1 style="text-align:center">📱 QR Attendance Portal</h1>', unsafe_allow_html=True)
     st.markdown("### Mark Your Attendance")
     st.info(f"🏢 **Company / Drive:** {company}")
 
-    roll = st.text_input("Roll Number", key="qr_roll", placeholder="e.g. 22311a0138")
-    if st.button("✅ Mark Attendance", type="primary", key="mark_btn"):
+    # A form sends the roll and the click together: one rerun per submit, none while typing/blurring
+    with st.form("mark_form"):
+        roll = st.text_input("Roll Number", key="qr_roll", placeholder="e.g. 22311a0138")
+        submitted = st.form_submit_button("✅ Mark Attendance", type="primary")
+    if submitted:
         if roll.strip():
             with st.spinner("Marking attendance..."):
-                ok, msg = mark_attendance(roll, company, device_id)
+                ok, msg, stamp = mark_attendance(roll, company, device_id)
             if ok:
                 st.success(msg); st.balloons()
-                st.info(f"**Roll:** {roll.strip()} | **Company:** {company} | **Time:** {ist_time_str()} | **Date:** {ist_date_str()}")
+                time_str, date_str = stamp
+                st.info(f"**Roll:** {roll.strip()} | **Company:** {company} | **Time:** {time_str} | **Date:** {date_str}")
             else:
                 st.error(msg)
         else:
@@ -242,7 +664,7 @@ def student_portal(company, device_id):
             u = st.text_input("Username", key="adm_u")
             p = st.text_input("Password", type="password", key="adm_p")
             if st.button("Login", key="adm_login"):
-                if u in ADMINS and ADMINS[u]["password"] == p:
+                if is_admin(u, p):
                     st.session_state.admin_logged_app1 = True
                     st.session_state.qr_access_granted = True
                     st.success("✅ Logged in!"); st.rerun()
@@ -256,223 +678,27 @@ def student_portal(company, device_id):
         st.markdown("---")
         admin_tabs = st.tabs(["📂 Upload Students","📊 Today's Attendance","📋 All Records","✍️ Manual Entry","📱 Device Bindings"])
 
+        # One companies lookup per render, shared by the tabs below
+        try:
+            comps = load_companies()
+        except Exception as e:
+            comps = []
+            st.error(f"Error loading companies: {e}")
+
         with admin_tabs[0]:
-            st.markdown("### 📂 Upload Students")
-            st.info("Upload Excel/CSV with student data. Will bulk insert to database.")
-            uf = st.file_uploader("Upload File", type=["csv", "xlsx"], key="stu_upload")
-            if uf:
-                try:
-                    if uf.name.endswith('.csv'):
-                        df = pd.read_csv(uf)
-                    else:
-                        df = pd.read_excel(uf)
-                    
-                    # Normalize columns
-                    if 'Roll No' in df.columns:
-                        df = df.rename(columns={'Roll No': 'rollnumber'})
-                    elif 'rollnumber' not in df.columns:
-                        st.error("❌ Must have 'Roll No' or 'rollnumber' column!")
-                        st.stop()
-                    
-                    df['rollnumber'] = df['rollnumber'].astype(str).str.strip().str.lower()
-                    
-                    # Remove rows with empty/invalid roll numbers
-                    df = df[df['rollnumber'].notna()]
-                    df = df[df['rollnumber'] != '']
-                    df = df[df['rollnumber'] != 'nan']
-                    df = df[~df['rollnumber'].str.lower().isin(['none', 'null', 'na'])]
-                    
-                    # Map columns to database schema
-                    col_map = {
-                        'S.No.': 'sno',
-                        'Name': 'name',
-                        'Course': 'course',
-                        'Mobile': 'mobile',
-                        'Email ID': 'email',
-                        'Gender': 'gender',
-                        'Current Term Score': 'current_term_score',
-                        'Xth percentage': 'xth_percentage',
-                        'XIIth percentage': 'xiith_percentage',
-                        'Backlogs': 'backlogs'
-                    }
-                    df = df.rename(columns=col_map)
-                    
-                    # Select only columns that exist in DB
-                    db_cols = ['rollnumber', 'name', 'course', 'mobile', 'email', 'gender', 
-                               'current_term_score', 'xth_percentage', 'xiith_percentage', 'backlogs']
-                    upload_cols = [c for c in db_cols if c in df.columns]
-                    df_upload = df[upload_cols]
-                    
-                    st.success(f"✅ Found {len(df_upload)} students")
-                    st.dataframe(df_upload.head(10), use_container_width=True)
-                    
-                    if st.button("📤 Upload to Database", key="do_upload"):
-                        with st.spinner(f"Uploading {len(df_upload)} students..."):
-                            # Aggressively replace ALL NaN/inf values with None
-                            df_clean = df_upload.fillna('')  # First fill NaN with empty string
-                            df_clean = df_clean.replace(['nan', 'NaN', 'NAN', float('inf'), float('-inf')], None)
-                            
-                            data = df_clean.to_dict('records')
-                            
-                            # Clean each record
-                            for student in data:
-                                for key, value in list(student.items()):
-                                    # Convert empty strings to None
-                                    if value == '' or value == 'nan':
-                                        student[key] = None
-                                    # Handle mobile numbers specially
-                                    elif key == 'mobile' and value is not None:
-                                        try:
-                                            if isinstance(value, (int, float)):
-                                                student[key] = str(int(value))
-                                            else:
-                                                student[key] = str(value).strip()
-                                        except (ValueError, TypeError):
-                                            student[key] = None
-                                    # Handle numeric fields
-                                    elif key in ['current_term_score', 'xth_percentage', 'xiith_percentage']:
-                                        if value == '' or value is None:
-                                            student[key] = None
-                                        else:
-                                            try:
-                                                student[key] = float(value)
-                                            except (ValueError, TypeError):
-                                                student[key] = None
-                            
-                            try:
-                                # Batch insert (500 at a time)
-                                batch_size = 500
-                                success_count = 0
-                                for i in range(0, len(data), batch_size):
-                                    batch = data[i:i+batch_size]
-                                    supabase.table('students').upsert(batch, on_conflict='rollnumber').execute()
-                                    success_count += len(batch)
-                                    st.info(f"Uploaded {success_count}/{len(data)} students...")
-                                st.success(f"✅ {len(data)} students uploaded successfully!")
-                            except Exception as e:
-                                st.error(f"❌ Error: {str(e)}")
-                except Exception as e:
-                    st.error(f"❌ Error reading file: {str(e)}")
+            _admin_upload_tab()
 
         with admin_tabs[1]:
-            st.markdown("### 📅 Today's Attendance")
-            try:
-                companies = supabase.table('companies').select('name').execute()
-                if companies.data:
-                    comp = st.selectbox("Company:", [c['name'] for c in companies.data], key="today_comp")
-                    today = ist_date_str()
-                    
-                    # Get attendance with student details
-                    att = supabase.table('attendance').select('*').eq('company', comp).eq('datestamp', today).execute()
-                    if att.data:
-                        att_df = pd.DataFrame(att.data)
-                        
-                        # Get student details
-                        rolls = att_df['rollnumber'].unique().tolist()
-                        students = supabase.table('students').select('*').in_('rollnumber', rolls).execute()
-                        stu_df = pd.DataFrame(students.data) if students.data else pd.DataFrame()
-                        
-                        if not stu_df.empty:
-                            merged = att_df.merge(stu_df, on='rollnumber', how='left')
-                            merged.insert(0, 'S.No', range(1, len(merged) + 1))
-                            st.success(f"**{len(merged)} present**")
-                            st.dataframe(merged, use_container_width=True, hide_index=True)
-                            st.download_button("⬇️ Download", merged.to_csv(index=False).encode(), f"attendance_{comp}_{today}.csv", "text/csv")
-                        else:
-                            st.dataframe(att_df, use_container_width=True, hide_index=True)
-                    else:
-                        st.info("No attendance today.")
-            except Exception as e:
-                st.error(f"Error: {e}")
+            _admin_today_tab(comps)
 
         with admin_tabs[2]:
-            st.markdown("### 📋 All Attendance Records")
-            try:
-                companies = supabase.table('companies').select('name').execute()
-                if companies.data:
-                    for comp_row in companies.data:
-                        comp = comp_row['name']
-                        att = supabase.table('attendance').select('*').eq('company', comp).execute()
-                        if att.data:
-                            att_df = pd.DataFrame(att.data)
-                            rolls = att_df['rollnumber'].unique().tolist()
-                            students = supabase.table('students').select('*').in_('rollnumber', rolls).execute()
-                            stu_df = pd.DataFrame(students.data) if students.data else pd.DataFrame()
-                            
-                            if not stu_df.empty:
-                                merged = att_df.merge(stu_df, on='rollnumber', how='left')
-                                merged.insert(0, 'S.No', range(1, len(merged) + 1))
-                            else:
-                                merged = att_df
-                            
-                            c1,c2,c3 = st.columns([2,1,1])
-                            with c1: st.write(f"🏢 **{comp}**")
-                            with c2: st.write(f"{len(merged)} records")
-                            with c3: st.download_button("⬇️", merged.to_csv(index=False).encode(), f"attendance_{comp}.csv", "text/csv", key=f"dl_{comp}")
-                            st.markdown("---")
-            except Exception as e:
-                st.error(f"Error: {e}")
+            _admin_records_tab(comps)
 
         with admin_tabs[3]:
-            st.markdown("### ✍️ Manual Entry")
-            try:
-                students = supabase.table('students').select('rollnumber').execute()
-                rolls = [s['rollnumber'] for s in students.data] if students.data else []
-                
-                man_roll = st.selectbox("Roll Number:", [""] + rolls, key="man_roll") if rolls else st.text_input("Roll:", key="man_roll_txt")
-                
-                companies = supabase.table('companies').select('name').execute()
-                comps = [c['name'] for c in companies.data] if companies.data else []
-                
-                mode = st.radio("Company:", ["Select Existing","Enter New"], horizontal=True, key="man_mode")
-                man_company = None
-                if mode == "Select Existing":
-                    if comps: man_company = st.selectbox("Select:", comps, key="man_comp_sel")
-                if mode == "Enter New":
-                    nc = st.text_input("Company Name:", key="man_new_comp")
-                    if nc.strip(): man_company = nc.strip()
-                
-                from datetime import date
-                man_date = st.date_input("Date:", value=date.today(), key="man_date")
-                
-                if st.button("✅ Mark", type="primary", key="man_mark"):
-                    if man_roll and man_company:
-                        ds = man_date.strftime("%d-%m-%Y")
-                        try:
-                            supabase.table('attendance').insert({
-                                'rollnumber': str(man_roll).strip().lower(),
-                                'company': man_company,
-                                'timestamp': ist_time_str(),
-                                'datestamp': ds,
-                                'device_id': 'MANUAL_ADMIN'
-                            }).execute()
-                            st.success(f"✅ {man_roll} marked for {man_company} on {ds}!")
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
-                    else:
-                        st.warning("Enter both roll and company.")
-            except Exception as e:
-                st.error(f"Error: {e}")
+            _admin_manual_tab(comps)
 
         with admin_tabs[4]:
-            st.markdown("### 📱 Device Bindings")
-            st.info("One device = one student. Unbind here if student changes device.")
-            try:
-                bindings = supabase.table('device_binding').select('*').execute()
-                if bindings.data:
-                    df = pd.DataFrame(bindings.data)
-                    st.dataframe(df, use_container_width=True)
-                    st.info(f"**{len(df)} devices bound**")
-                    
-                    to_unbind = st.selectbox("Roll to Unbind:", [""]+df['rollnumber'].tolist(), key="unbind_sel")
-                    if to_unbind and st.button("🔓 Unbind", key="unbind_btn"):
-                        supabase.table('device_binding').delete().eq('rollnumber', to_unbind).execute()
-                        st.success(f"✅ '{to_unbind}' unbound.")
-                        st.rerun()
-                else:
-                    st.info("No devices bound yet.")
-            except Exception as e:
-                st.error(f"Error: {e}")
+            _admin_bindings_tab()
 
     st.markdown("---")
     st.caption("📱 Smart Attendance Tracker — QR Portal | Powered by Streamlit + Supabase")
@@ -483,7 +709,6 @@ def main():
 
     # Device ID from session (simple UUID)
     if not st.session_state.device_id:
-        import uuid
         st.session_state.device_id = "SES_" + uuid.uuid4().hex[:20].upper()
 
     # ADMIN: no checks
@@ -504,7 +729,7 @@ def main():
             u = st.text_input("Username", key="bl_u")
             p = st.text_input("Password", type="password", key="bl_p")
             if st.button("Login", key="bl_btn"):
-                if u in ADMINS and ADMINS[u]["password"] == p:
+                if is_admin(u, p):
                     st.session_state.admin_logged_app1 = True
                     st.session_state.qr_access_granted = True
                     st.success("✅ Logged in!"); st.rerun()
@@ -519,8 +744,12 @@ def main():
         if not JS_EVAL_AVAILABLE:
             st.error("❌ Location library not installed. Add `streamlit-js-eval==0.1.7` to requirements.txt")
             st.stop()
-        check_location_with_js_eval(company)
-        return
+        # Stops the run until a fix lands inside the radius; on success clear the prompt and
+        # carry straight on to the portal instead of spending another rerun
+        loc_box = st.empty()
+        with loc_box.container():
+            check_location_with_js_eval(company)
+        loc_box.empty()
 
     if loc_required:
         st.success("✅ QR & Location verified!")
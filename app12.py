@@ -7,6 +7,9 @@ import requests
 import json
 import time
 import os
+import csv
+import hmac
+import threading
 from pathlib import Path
 from typing import Tuple
 import qrcode
@@ -32,6 +35,13 @@ except Exception as _:
     # Silently fall back to API-only mode without showing warning
     pass
 
+# pyarrow powers the fast CSV parser; without it we use pandas' default CSV reader
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except Exception as _:
+    PYARROW_AVAILABLE = False
+
 # ------------------------------
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 # ------------------------------
@@ -308,8 +318,9 @@ def query_huggingface_model(prompt, max_tokens=200, model_id=DEFAULT_HF_INSTRUCT
     return "" # Return empty string on final failure
 
 # ------------------------------
-# Robust CSS loader
-def local_css(file_name="style.css"):
+# Robust CSS loader (file is read once per process, not on every rerun; the same string is reused)
+@st.cache_resource(show_spinner=False)
+def load_css_block(file_name="style.css"):
     try:
         base = Path(__file__).parent
     except Exception as _:
@@ -318,9 +329,15 @@ def local_css(file_name="style.css"):
     try:
         if css_file_path.exists():
             with open(css_file_path, encoding="utf-8") as f:
-                st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+                return f"<style>{f.read()}</style>"
     except Exception as _:
         pass  # Silently use default Streamlit styling
+    return ""
+
+def local_css(file_name="style.css"):
+    css_block = load_css_block(file_name)
+    if css_block:
+        st.markdown(css_block, unsafe_allow_html=True)
 
 local_css()
 
@@ -349,11 +366,88 @@ OTP_VALIDITY_MINUTES = 5
 STUDENTS_NEW_CSV = "students_new.csv"
 ATTENDANCE_NEW_CSV = "attendance_new.csv"
 
+# Canonical column order for each CSV (resolved once at import, reused by every load)
+STUDENTS_COLUMNS = ["username", "password", "college", "level", "remarks"]
+ATTENDANCE_COLUMNS = ["date", "username", "college", "level", "timestamp"]
+STUDENTS_NEW_COLUMNS = ["rollnumber", "studentname", "branch"]
+ATTENDANCE_NEW_COLUMNS = ["rollnumber", "studentname", "timestamp", "datestamp"]
+LOG_COLUMNS = ["timestamp", "action", "details"]
+
 # ------------------------------
 # CSV helpers
+def read_csv_fast(csv_path) -> pd.DataFrame:
+    """pd.read_csv using Arrow's multithreaded parser when pyarrow is installed.
+
+    Every table here is text (usernames, passwords, roll numbers, dates), so columns are
+    read as str: no type inference, and e.g. a numeric password stays comparable to input.
+    """
+    if PYARROW_AVAILABLE:
+        try:
+            return pd.read_csv(csv_path, engine="pyarrow", dtype=str)
+        except FileNotFoundError:
+            raise
+        except Exception as _:
+            pass  # Fall back to the default parser for anything Arrow rejects
+    return pd.read_csv(csv_path, dtype=str)
+
+def file_version(csv_path: str) -> tuple:
+    """(mtime_ns, size) of a data file, used as a cache key; (0, 0) if it does not exist yet.
+
+    The size disambiguates two appends landing within one mtime tick: every append grows the file.
+    """
+    try:
+        info = os.stat(csv_path)
+        return info.st_mtime_ns, info.st_size
+    except OSError:
+        return 0, 0
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _read_table_version(csv_path: str, version: tuple) -> pd.DataFrame:
+    """read_csv_fast memoized per file version (Streamlit hands every caller its own copy)."""
+    return read_csv_fast(csv_path)
+
+def read_table_cached(csv_path: str) -> pd.DataFrame:
+    """Read a CSV table, re-parsing only when the file has changed since the last read."""
+    return _read_table_version(csv_path, file_version(csv_path))
+
+@st.cache_resource
+def _csv_write_lock():
+    """Process-wide lock serializing CSV appends across sessions (module globals reset on rerun)."""
+    return threading.Lock()
+
+def append_csv_row(csv_path: str, columns: list, row: dict) -> tuple:
+    """Append a single row to a CSV table instead of reading and rewriting the whole file.
+
+    If the existing header is not the canonical column list (e.g. an older students.csv
+    without 'remarks'), the file is rewritten once in canonical order and then appended to.
+    Returns the file_version right after this append, taken before any other writer can run.
+    """
+    with _csv_write_lock():
+        _append_csv_row(Path(csv_path), columns, row)
+        return file_version(csv_path)
+
+def _append_csv_row(path: Path, columns: list, row: dict):
+    header, needs_newline = None, False
+    if path.exists() and path.stat().st_size > 0:
+        with open(path, "rb") as f:
+            header = next(csv.reader([f.readline().decode("utf-8-sig")]), [])
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) not in (b"\n", b"\r")
+    if header is not None and header != columns:
+        pd.read_csv(path, dtype=str).reindex(columns=columns, fill_value="").to_csv(path, index=False)
+        needs_newline = False
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        if needs_newline:
+            f.write("\n")
+        writer = csv.writer(f, lineterminator="\n")
+        if header is None:
+            writer.writerow(columns)
+        writer.writerow([row.get(col, "") for col in columns])
+
 def ensure_students_schema(df: pd.DataFrame) -> pd.DataFrame:
-    expected = ["username", "password", "college", "level", "remarks"]
-    for col in expected:
+    if list(df.columns) == STUDENTS_COLUMNS:
+        return df
+    for col in STUDENTS_COLUMNS:
         if col not in df.columns:
             if col == "remarks":
                 df[col] = ""
@@ -361,114 +455,124 @@ def ensure_students_schema(df: pd.DataFrame) -> pd.DataFrame:
                 df[col] = "default123"
             else:
                 df[col] = ""
-    return df[expected]
+    return df[STUDENTS_COLUMNS]
 
 def load_students():
     try:
-        df = pd.read_csv(STUDENTS_CSV)
+        df = read_table_cached(STUDENTS_CSV)
         df = ensure_students_schema(df)
         return df
     except FileNotFoundError:
-        df = pd.DataFrame(columns=["username", "password", "college", "level", "remarks"])
+        df = pd.DataFrame(columns=STUDENTS_COLUMNS)
         df.to_csv(STUDENTS_CSV, index=False)
         return df
     except Exception as _:
         st.error(f"Students CSV read error: {_}. Recreating students file.")
-        df = pd.DataFrame(columns=["username", "password", "college", "level", "remarks"])
+        df = pd.DataFrame(columns=STUDENTS_COLUMNS)
         df.to_csv(STUDENTS_CSV, index=False)
         return df
 
 def save_students(df):
-    df.to_csv(STUDENTS_CSV, index=False)
+    with _csv_write_lock():
+        df.to_csv(STUDENTS_CSV, index=False)
+
+def update_student_field(username: str, column: str, value):
+    """Set one field for a student, re-reading students.csv under the write lock so that a
+    row appended since the admin page rendered is not overwritten by a stale frame."""
+    with _csv_write_lock():
+        df = ensure_students_schema(read_csv_fast(STUDENTS_CSV))
+        df.loc[df["username"] == username, column] = value
+        df.to_csv(STUDENTS_CSV, index=False)
 
 def ensure_attendance_schema(df: pd.DataFrame) -> pd.DataFrame:
-    expected = ["date", "username", "college", "level", "timestamp"]
-    for col in expected:
+    if list(df.columns) == ATTENDANCE_COLUMNS:
+        return df
+    for col in ATTENDANCE_COLUMNS:
         if col not in df.columns:
             df[col] = ""
-    return df[expected]
+    return df[ATTENDANCE_COLUMNS]
 
 def load_attendance():
     try:
-        df = pd.read_csv(ATTENDANCE_CSV)
+        df = read_table_cached(ATTENDANCE_CSV)
         df = ensure_attendance_schema(df)
         return df
     except FileNotFoundError:
-        df = pd.DataFrame(columns=["date", "username", "college", "level", "timestamp"])
+        df = pd.DataFrame(columns=ATTENDANCE_COLUMNS)
         df.to_csv(ATTENDANCE_CSV, index=False)
         return df
     except Exception as _:
         st.error(f"Attendance CSV read error: {_}. Recreating attendance file.")
-        df = pd.DataFrame(columns=["date", "username", "college", "level", "timestamp"])
+        df = pd.DataFrame(columns=ATTENDANCE_COLUMNS)
         df.to_csv(ATTENDANCE_CSV, index=False)
         return df
 
 def save_attendance(df):
-    df.to_csv(ATTENDANCE_CSV, index=False)
+    with _csv_write_lock():
+        df.to_csv(ATTENDANCE_CSV, index=False)
 
 def log_action(action: str, details: str = ""):
     now = datetime.now().isoformat()
     row = {"timestamp": now, "action": action, "details": details}
     try:
-        if Path(LOG_CSV).exists():
-            log_df = pd.read_csv(LOG_CSV)
-            log_df = pd.concat([log_df, pd.DataFrame([row])], ignore_index=True)
-        else:
-            log_df = pd.DataFrame([row])
-        log_df.to_csv(LOG_CSV, index=False)
+        append_csv_row(LOG_CSV, LOG_COLUMNS, row)
     except Exception as _:
         st.warning(f"Could not write log: {_}")
 
 # NEW: Functions for QR-based attendance
 def ensure_students_new_schema(df: pd.DataFrame) -> pd.DataFrame:
-    expected = ["rollnumber", "studentname", "branch"]
-    for col in expected:
+    if list(df.columns) == STUDENTS_NEW_COLUMNS:
+        return df
+    for col in STUDENTS_NEW_COLUMNS:
         if col not in df.columns:
             df[col] = ""
-    return df[expected]
+    return df[STUDENTS_NEW_COLUMNS]
 
 def load_students_new():
     try:
-        df = pd.read_csv(STUDENTS_NEW_CSV)
+        df = read_table_cached(STUDENTS_NEW_CSV)
         df = ensure_students_new_schema(df)
         return df
     except FileNotFoundError:
-        df = pd.DataFrame(columns=["rollnumber", "studentname", "branch"])
+        df = pd.DataFrame(columns=STUDENTS_NEW_COLUMNS)
         df.to_csv(STUDENTS_NEW_CSV, index=False)
         return df
     except Exception as _:
         st.error(f"Students New CSV read error: {_}. Recreating students_new file.")
-        df = pd.DataFrame(columns=["rollnumber", "studentname", "branch"])
+        df = pd.DataFrame(columns=STUDENTS_NEW_COLUMNS)
         df.to_csv(STUDENTS_NEW_CSV, index=False)
         return df
 
 def save_students_new(df):
-    df.to_csv(STUDENTS_NEW_CSV, index=False)
+    with _csv_write_lock():
+        df.to_csv(STUDENTS_NEW_CSV, index=False)
 
 def ensure_attendance_new_schema(df: pd.DataFrame) -> pd.DataFrame:
-    expected = ["rollnumber", "studentname", "timestamp", "datestamp"]
-    for col in expected:
+    if list(df.columns) == ATTENDANCE_NEW_COLUMNS:
+        return df
+    for col in ATTENDANCE_NEW_COLUMNS:
         if col not in df.columns:
             df[col] = ""
-    return df[expected]
+    return df[ATTENDANCE_NEW_COLUMNS]
 
 def load_attendance_new():
     try:
-        df = pd.read_csv(ATTENDANCE_NEW_CSV)
+        df = read_table_cached(ATTENDANCE_NEW_CSV)
         df = ensure_attendance_new_schema(df)
         return df
     except FileNotFoundError:
-        df = pd.DataFrame(columns=["rollnumber", "studentname", "timestamp", "datestamp"])
+        df = pd.DataFrame(columns=ATTENDANCE_NEW_COLUMNS)
         df.to_csv(ATTENDANCE_NEW_CSV, index=False)
         return df
     except Exception as _:
         st.error(f"Attendance New CSV read error: {_}. Recreating attendance_new file.")
-        df = pd.DataFrame(columns=["rollnumber", "studentname", "timestamp", "datestamp"])
+        df = pd.DataFrame(columns=ATTENDANCE_NEW_COLUMNS)
         df.to_csv(ATTENDANCE_NEW_CSV, index=False)
         return df
 
 def save_attendance_new(df):
-    df.to_csv(ATTENDANCE_NEW_CSV, index=False)
+    with _csv_write_lock():
+        df.to_csv(ATTENDANCE_NEW_CSV, index=False)
 
 def generate_qr_code():
     """Generate QR code that links directly to https://smartapp12.streamlit.app with access token"""
@@ -503,42 +607,58 @@ def generate_qr_code():
     
     return img_base64, qr_url
 
+@st.cache_data(show_spinner=False)
+def qr_student_keys(version: tuple) -> frozenset:
+    """Lowercased (rollnumber, studentname, branch) keys, built once per students_new.csv version."""
+    df = load_students_new()
+    return frozenset(zip(*(df[col].fillna("").astype(str).str.lower() for col in STUDENTS_NEW_COLUMNS)))
+
+@st.cache_resource
+def _qr_attendance_index():
+    """Process-wide set of lowercased rollnumbers in attendance_new.csv for one date, shared by all sessions."""
+    return {"lock": threading.Lock(), "version": None, "date": None, "marked": set()}
+
+def qr_marked_on(day: str) -> set:
+    """Rollnumbers already marked via QR on `day`; rebuilt when the day rolls over or the CSV changed."""
+    index = _qr_attendance_index()
+    version = file_version(ATTENDANCE_NEW_CSV)
+    if index["date"] != day or index["version"] != version:
+        df = load_attendance_new()
+        index["marked"] = set(df.loc[df["datestamp"] == day, "rollnumber"].astype(str).str.lower())
+        index["date"], index["version"] = day, version
+    return index["marked"]
+
+@st.cache_data(show_spinner=False)
+def qr_rollnumbers_folded(version: tuple) -> frozenset:
+    """Casefolded rollnumbers in students_new.csv, built once per file version."""
+    return frozenset(load_students_new()["rollnumber"].astype(str).str.casefold())
+
 def mark_attendance_qr(rollnumber, studentname, branch):
     """Mark attendance using QR code portal"""
-    students_new_df = load_students_new()
-    
     # Validate student exists in students_new.csv
-    student_record = students_new_df[
-        (students_new_df['rollnumber'].str.lower() == rollnumber.lower()) &
-        (students_new_df['studentname'].str.lower() == studentname.lower()) &
-        (students_new_df['branch'].str.lower() == branch.lower())
-    ]
-    
-    if student_record.empty:
+    student_key = (rollnumber.lower(), studentname.lower(), branch.lower())
+    if student_key not in qr_student_keys(file_version(STUDENTS_NEW_CSV)):
         return False, "Student not found in the database. Please check your Roll Number, Name, and Branch."
     
-    # Check if already marked today
-    attendance_new_df = load_attendance_new()
     today_date_str = date.today().isoformat()
-    
-    already_marked = attendance_new_df[
-        (attendance_new_df['rollnumber'].str.lower() == rollnumber.lower()) &
-        (attendance_new_df['datestamp'] == today_date_str)
-    ]
-    
-    if not already_marked.empty:
-        return False, "Attendance already marked today for this student via QR code."
-    
-    # Mark attendance
-    new_entry = {
-        "rollnumber": rollnumber,
-        "studentname": studentname,
-        "timestamp": datetime.now().strftime("%H:%M:%S"),
-        "datestamp": today_date_str
-    }
-    
-    attendance_new_df = pd.concat([attendance_new_df, pd.DataFrame([new_entry])], ignore_index=True)
-    save_attendance_new(attendance_new_df)
+    index = _qr_attendance_index()
+    with index["lock"]:
+        # Check if already marked today
+        marked_today = qr_marked_on(today_date_str)
+        if rollnumber.lower() in marked_today:
+            return False, "Attendance already marked today for this student via QR code."
+        
+        # Mark attendance
+        new_entry = {
+            "rollnumber": rollnumber,
+            "studentname": studentname,
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "datestamp": today_date_str
+        }
+        
+        version = append_csv_row(ATTENDANCE_NEW_CSV, ATTENDANCE_NEW_COLUMNS, new_entry)
+        marked_today.add(rollnumber.lower())
+        index["version"] = version
     log_action("qr_attendance_marked", f"{rollnumber} - {studentname}")
     
     return True, "Attendance marked successfully via QR code ✅"
@@ -575,27 +695,52 @@ def verify_otp(username, input_otp):
 
 # ------------------------------
 # Attendance functions
+@st.cache_resource
+def _attendance_index():
+    """Process-wide (username, date) index of attendance.csv, shared by all sessions."""
+    return {"lock": threading.Lock(), "version": None, "marked": set()}
+
+def attendance_marks() -> set:
+    """(username, date) pairs already recorded; re-read only if the CSV changed behind our back."""
+    index = _attendance_index()
+    version = file_version(ATTENDANCE_CSV)
+    if index["version"] != version:
+        # Stamp the version seen before loading: a write landing mid-reload triggers another reload
+        df = load_attendance()
+        index["marked"] = set(zip(df["username"].astype(str), df["date"].astype(str)))
+        index["version"] = version
+    return index["marked"]
+
+@st.cache_data(show_spinner=False)
+def student_usernames(version: tuple) -> frozenset:
+    """Usernames in students.csv, built once per file version."""
+    return frozenset(load_students()["username"].astype(str))
+
+@st.cache_data(show_spinner=False)
+def student_usernames_folded(version: tuple) -> frozenset:
+    """Casefolded usernames in students.csv, for case-insensitive duplicate checks."""
+    return frozenset(load_students()["username"].astype(str).str.casefold())
+
 def has_marked_attendance_today(username):
-    attendance_df = load_attendance()
-    today_date_str = date.today().isoformat()
-    return not attendance_df[(attendance_df['username'] == username) & (attendance_df['date'] == today_date_str)].empty
+    return (username, date.today().isoformat()) in attendance_marks()
 
 def mark_attendance(username, college, level):
-    students_df = load_students()
-    if username not in students_df["username"].values:
+    if username not in student_usernames(file_version(STUDENTS_CSV)):
         return False, "Username not found. Please contact admin to add your account."
-    if has_marked_attendance_today(username):
-        return False, "Attendance already marked today for this student."
-    df = load_attendance()
-    new_entry = {
-        "date": date.today().isoformat(),
-        "username": username,
-        "college": college,
-        "level": level,
-        "timestamp": datetime.now().strftime("%H:%M:%S"),
-    }
-    df = pd.concat([df, pd.DataFrame([new_entry])], ignore_index=True)
-    save_attendance(df)
+    index = _attendance_index()
+    with index["lock"]:
+        if has_marked_attendance_today(username):
+            return False, "Attendance already marked today for this student."
+        new_entry = {
+            "date": date.today().isoformat(),
+            "username": username,
+            "college": college,
+            "level": level,
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+        }
+        version = append_csv_row(ATTENDANCE_CSV, ATTENDANCE_COLUMNS, new_entry)
+        index["marked"].add((username, new_entry["date"]))
+        index["version"] = version
     return True, "Attendance marked successfully ✅"
 
 # ------------------------------
@@ -778,12 +923,17 @@ def summarize_student_remark_for_student(admin_remark):
 
 # ------------------------------
 # Admin login/logout
+def is_admin(username: str, password: str) -> bool:
+    """Check admin credentials; the password comparison is constant-time."""
+    admin = ADMINS.get(username)
+    return admin is not None and hmac.compare_digest(str(admin["password"]).encode(), password.encode())
+
 def admin_login():
     st.sidebar.header("🔐 Admin Login")
     username = st.sidebar.text_input("Username", key="admin_username_input")
     password = st.sidebar.text_input("Password", type="password", key="admin_password_input")
     if st.sidebar.button("Login as Admin"):
-        if username in ADMINS and ADMINS[username]["password"] == password:
+        if is_admin(username, password):
             st.session_state.admin_logged = True
             st.session_state.admin_user = username
             st.sidebar.success(f"Welcome, {username}")
@@ -860,8 +1010,11 @@ def admin_panel():
 
     tabs = st.tabs(["➕ Manage Students", "📊 View Attendance", "🧠 AI Analytics Summary", "📄 Student AI Reports", "📋 Logs", "🆕 QR Students & Attendance"])
 
+    # Every tab renders on each rerun; load the roster once and share it between them
+    students_df = load_students()
+
     with tabs[0]:
-        df = load_students()
+        df = students_df
         st.markdown('<div class="subheader">Add New Student</div>', unsafe_allow_html=True)
         new_username = st.text_input("Username", key="new_student_username")
         new_college = st.text_input("College", key="new_student_college")
@@ -869,7 +1022,7 @@ def admin_panel():
 
         if st.button("Add Student", key="add_student_button"):
             if new_username and new_college:
-                if new_username.lower() in df["username"].str.lower().values:
+                if new_username.casefold() in student_usernames_folded(file_version(STUDENTS_CSV)):
                     st.warning(f"Username '{new_username}' already exists. Please choose a different one.")
                 else:
                     new_student = {
@@ -879,8 +1032,7 @@ def admin_panel():
                         "level": new_level,
                         "remarks": ""
                     }
-                    df = pd.concat([df, pd.DataFrame([new_student])], ignore_index=True)
-                    save_students(df)
+                    append_csv_row(STUDENTS_CSV, STUDENTS_COLUMNS, new_student)
                     st.success(f"Student '{new_username}' added successfully.")
                     log_action("add_student", new_username)
                     st.rerun()
@@ -908,8 +1060,7 @@ def admin_panel():
                 current_remarks = df[df['username'] == selected_student_for_remarks]['remarks'].iloc[0]
                 new_remark = st.text_area(f"Add/Edit Remarks for {selected_student_for_remarks}", value=current_remarks, key="admin_student_remark_input")
                 if st.button(f"Save Remarks for {selected_student_for_remarks}", key="save_student_remark_button"):
-                    df.loc[df['username'] == selected_student_for_remarks, 'remarks'] = new_remark
-                    save_students(df)
+                    update_student_field(selected_student_for_remarks, 'remarks', new_remark)
                     st.success(f"Remarks saved for {selected_student_for_remarks}")
                     log_action("save_remark", selected_student_for_remarks)
                     st.rerun()
@@ -919,8 +1070,7 @@ def admin_panel():
                     # to clear a device ID, as device binding isn't implemented.
                     # We log the action as requested by the original code.
                     # As a proxy for 'reset device', we reset their password to force re-login/re-binding logic if implemented later.
-                    df.loc[df["username"] == selected_student_for_remarks, "password"] = "default123"
-                    save_students(df)
+                    update_student_field(selected_student_for_remarks, "password", "default123")
                     st.success(f"Device binding reset (password reset to default123) for {selected_student_for_remarks}. They will be able to bind a new device on next attendance.")
                     log_action("reset_device", selected_student_for_remarks)
                     st.rerun()
@@ -928,7 +1078,7 @@ def admin_panel():
                 st.info("No students added yet. Please add a new student above.")
 
         st.markdown('<div class="subheader">All Students</div>', unsafe_allow_html=True)
-        dfall = load_students()
+        dfall = students_df
         if not dfall.empty:
             st.dataframe(dfall.drop(columns=["password"]), width=1200)
         else:
@@ -989,7 +1139,7 @@ def admin_panel():
 
     with tabs[3]:
         st.markdown('<div class="subheader">📄 AI-Powered Student Report Generator</div>', unsafe_allow_html=True)
-        students_df_for_report = load_students()
+        students_df_for_report = students_df
         if not students_df_for_report.empty:
             student_for_report = st.selectbox("Select Student for AI Report", [""] + sorted(students_df_for_report["username"].tolist()), key="select_student_report")
             if student_for_report:
@@ -1006,7 +1156,7 @@ def admin_panel():
     with tabs[4]:
         st.markdown('<div class="subheader">📋 Activity Logs</div>', unsafe_allow_html=True)
         if Path(LOG_CSV).exists():
-            log_df = pd.read_csv(LOG_CSV)
+            log_df = read_csv_fast(LOG_CSV)
             st.dataframe(log_df.tail(200).sort_values("timestamp", ascending=False), width=1200)
         else:
             st.info("No logs yet.")
@@ -1023,8 +1173,7 @@ def admin_panel():
         
         if st.button("Add QR Student", key="add_qr_student_button"):
             if new_rollnumber and new_studentname and new_branch:
-                students_new_df = load_students_new()
-                if new_rollnumber.lower() in students_new_df["rollnumber"].str.lower().values:
+                if new_rollnumber.casefold() in qr_rollnumbers_folded(file_version(STUDENTS_NEW_CSV)):
                     st.warning(f"Roll Number '{new_rollnumber}' already exists.")
                 else:
                     new_qr_student = {
@@ -1032,8 +1181,7 @@ def admin_panel():
                         "studentname": new_studentname,
                         "branch": new_branch
                     }
-                    students_new_df = pd.concat([students_new_df, pd.DataFrame([new_qr_student])], ignore_index=True)
-                    save_students_new(students_new_df)
+                    append_csv_row(STUDENTS_NEW_CSV, STUDENTS_NEW_COLUMNS, new_qr_student)
                     st.success(f"QR Student '{new_studentname}' added successfully.")
                     log_action("add_qr_student", new_rollnumber)
                     st.rerun()